@@ -1,6 +1,7 @@
                
 import sys
 import os
+import time
 from pathlib import Path
 
 # Add project root to Python path
@@ -12,9 +13,8 @@ import streamlit as st
 from dotenv import load_dotenv
 
 from src.document_processor import DocumentProcessor
-from src.embeddings_manager import EmbeddingsManager
 from src.chat_engine import ChatEngine
-from src.utils import save_uploaded_file, clear_chat_history
+from src.utils import save_uploaded_files, clear_chat_history, get_ingest_executor, get_embeddings_manager
 
 # Load environment variables
 load_dotenv()
@@ -34,6 +34,20 @@ if "chat_engine" not in st.session_state:
     st.session_state.chat_engine = None
 if "documents_loaded" not in st.session_state:
     st.session_state.documents_loaded = False
+if "ingest_future" not in st.session_state:
+    st.session_state.ingest_future = None
+
+
+def ingest_documents(file_paths, embeddings_manager):
+    """Load, split and embed documents; runs on a background thread."""
+    processor = DocumentProcessor(embeddings=embeddings_manager.embeddings)
+    documents = processor.load_documents(file_paths)
+    chunks = processor.split_documents(documents)
+    
+    # Create embeddings and vector store
+    vector_store = embeddings_manager.create_vector_store(chunks)
+    return len(documents), len(chunks), vector_store
+
 
 # Title and description
 st.title("🤖 Document Chatbot with Claude")
@@ -56,36 +70,45 @@ with st.sidebar:
             st.write(f"• {file.name}")
     
     # Process documents button
-    if st.button("🔄 Process Documents", type="primary", use_container_width=True):
+    ingesting = st.session_state.ingest_future is not None
+    if st.button("🔄 Process Documents", type="primary", use_container_width=True, disabled=ingesting):
         if not uploaded_files:
             st.error("Please upload at least one document")
         else:
-            with st.spinner("Processing documents..."):
-                try:
-                    # Save uploaded files
-                    file_paths = []
-                    for uploaded_file in uploaded_files:
-                        file_path = save_uploaded_file(uploaded_file)
-                        file_paths.append(file_path)
-                    
-                    # Process documents
-                    processor = DocumentProcessor()
-                    documents = processor.load_documents(file_paths)
-                    chunks = processor.split_documents(documents)
-                    
-                    # Create embeddings and vector store
-                    embeddings_manager = EmbeddingsManager()
-                    vector_store = embeddings_manager.create_vector_store(chunks)
-                    
-                    # Initialize chat engine with Claude
-                    st.session_state.chat_engine = ChatEngine(vector_store)
-                    st.session_state.documents_loaded = True
-                    
-                    st.success(f"✅ Successfully processed {len(documents)} documents!")
-                    st.info(f"Created {len(chunks)} text chunks for search")
-                    
-                except Exception as e:
-                    st.error(f"Error processing documents: {str(e)}")
+            try:
+                # Save uploaded files
+                file_paths = save_uploaded_files(uploaded_files)
+                
+                # The model is loaded once per process, not on every ingest
+                with st.spinner("Loading embedding model..."):
+                    embeddings_manager = get_embeddings_manager()
+                
+                # Process documents in the background so the app stays responsive
+                st.session_state.ingest_future = get_ingest_executor().submit(
+                    ingest_documents, file_paths, embeddings_manager
+                )
+                
+            except Exception as e:
+                st.error(f"Error processing documents: {str(e)}")
+    
+    ingest_future = st.session_state.ingest_future
+    if ingest_future is not None:
+        if not ingest_future.done():
+            st.info("⏳ Processing documents...")
+        else:
+            st.session_state.ingest_future = None
+            try:
+                num_documents, num_chunks, vector_store = ingest_future.result()
+                
+                # Initialize chat engine with Claude
+                st.session_state.chat_engine = ChatEngine(vector_store, embeddings_manager=get_embeddings_manager())
+                st.session_state.documents_loaded = True
+                
+                st.success(f"✅ Successfully processed {num_documents} documents!")
+                st.info(f"Created {num_chunks} text chunks for search")
+                
+            except Exception as e:
+                st.error(f"Error processing documents: {str(e)}")
     
     # Clear chat button
     if st.button("🗑️ Clear Chat History", use_container_width=True):
@@ -123,11 +146,18 @@ with st.sidebar:
         help="Maximum number of tokens in the response"
     )
     
+    cache_threshold = st.slider(
+        "Answer Cache Similarity",
+        0.80, 1.0, 0.95, 0.01,
+        help="Reuse a previous answer when a new question is at least this similar to it"
+    )
+    
     if st.session_state.chat_engine:
         st.session_state.chat_engine.update_settings(
             temperature=temperature,
             max_tokens=max_tokens,
-            model=claude_model
+            model=claude_model,
+            cache_threshold=cache_threshold
         )
     
     # Display model info
@@ -181,34 +211,38 @@ else:
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Generate response
+        # Generate response, rendering Claude's answer as it streams in
         with st.chat_message("assistant"):
-            with st.spinner("Claude is thinking..."):
-                try:
-                    response = st.session_state.chat_engine.get_response(
-                        prompt,
-                        st.session_state.messages
-                    )
-                    
-                    st.markdown(response["answer"])
-                    
-                    # Display sources
-                    if response.get("sources"):
-                        with st.expander("📚 Sources"):
-                            for i, source in enumerate(response["sources"], 1):
-                                st.markdown(f"**Source {i}:** {source}")
-                    
-                    # Add assistant message
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": response["answer"],
-                        "sources": response.get("sources", [])
-                    })
-                    
-                except Exception as e:
-                    error_msg = f"Error generating response: {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": error_msg
-                    })
+            try:
+                chat_engine = st.session_state.chat_engine
+                st.write_stream(chat_engine.stream_response(
+                    prompt,
+                    st.session_state.messages
+                ))
+                response = chat_engine.last_response
+                
+                # Display sources
+                if response.get("sources"):
+                    with st.expander("📚 Sources"):
+                        for i, source in enumerate(response["sources"], 1):
+                            st.markdown(f"**Source {i}:** {source}")
+                
+                # Add assistant message
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": response["answer"],
+                    "sources": response.get("sources", [])
+                })
+                
+            except Exception as e:
+                error_msg = f"Error generating response: {str(e)}"
+                st.error(error_msg)
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": error_msg
+                })
+
+# Poll background document processing until it finishes
+if st.session_state.ingest_future is not None:
+    time.sleep(0.5)
+    st.rerun()
@@ -1,14 +1,36 @@
 from langchain_anthropic import ChatAnthropic
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from typing import Dict, List
+from langchain.memory import ConversationBufferWindowMemory
+from langchain_core.messages import HumanMessage, SystemMessage
+from typing import Dict, Iterator, List
 import os
 
+from src.semantic_cache import SemanticCache
+
+
+# Number of recent exchanges kept in conversation memory
+MEMORY_WINDOW_TURNS = 6
+
+# Number of document chunks retrieved as context for each question
+RETRIEVAL_K = 4
+
+SYSTEM_PROMPT = """Use the following pieces of context to answer the user's question.
+If you don't know the answer, just say that you don't know, don't try to make up an answer.
+----------------
+{context}"""
+
+
+def _format_source(doc) -> str:
+    """Format a retrieved document as its source, page and a content preview."""
+    metadata = doc.metadata
+    content = doc.page_content
+    preview = content[:200] + "..." if len(content) > 200 else content
+    return f"{metadata.get('source', 'Unknown')} (Page {metadata.get('page', 'N/A')})\n{preview}"
+
 
 class ChatEngine:
     """Handles chat interactions with documents using LangChain and Anthropic Claude."""
     
-    def __init__(self, vector_store, model: str = "claude-sonnet-4-5-20250929", temperature: float = 0.0, max_tokens: int = 1024):
+    def __init__(self, vector_store, model: str = "claude-sonnet-4-5-20250929", temperature: float = 0.0, max_tokens: int = 1024, cache_threshold: float = 0.95, embeddings_manager=None):
         """
         Initialize the chat engine with Anthropic Claude.
         
@@ -17,39 +39,44 @@ class ChatEngine:
             model: Anthropic Claude model to use (claude-sonnet-4-5-20250929, claude-opus-4-1-20250805, claude-3-5-haiku-20241022)
             temperature: Sampling temperature (0.0 to 1.0)
             max_tokens: Maximum tokens in response
+            cache_threshold: Cosine similarity above which a previous answer is reused
+            embeddings_manager: EmbeddingsManager to retrieve through, reusing its search cache (optional)
         """
         api_key = os.getenv("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
         
         self.vector_store = vector_store
+        self.embeddings_manager = embeddings_manager
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.model = model
+        self._last_settings = (temperature, max_tokens, model)
+        self.last_response = None
         
-        # Initialize Claude LLM
-        self.llm = ChatAnthropic(
-            model=model,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            anthropic_api_key=api_key
-        )
+        # Answers to near-duplicate questions are served without calling Claude
+        self.response_cache = SemanticCache(threshold=cache_threshold)
         
-        # Initialize memory
-        self.memory = ConversationBufferMemory(
+        # Initialize memory, bounded so prompt size stays constant in long chats
+        self.memory = ConversationBufferWindowMemory(
+            k=MEMORY_WINDOW_TURNS,
             memory_key="chat_history",
             return_messages=True,
             output_key="answer"
         )
         
-        # Create retrieval chain
-        self.chain = ConversationalRetrievalChain.from_llm(
-            llm=self.llm,
-            retriever=vector_store.as_retriever(search_kwargs={"k": 4}),
-            memory=self.memory,
-            return_source_documents=True,
-            verbose=False
+        # Initialize Claude LLM
+        self._create_llm()
+    
+    def _create_llm(self):
+        """Create the Claude client from the current settings."""
+        self.client = ChatAnthropic(
+            model=self.model,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            anthropic_api_key=os.getenv("ANTHROPIC_API_KEY")
         )
+        self.llm = self.client
     
     def get_response(self, query: str, chat_history: List[Dict] = None) -> Dict:
         """
@@ -58,32 +85,78 @@ class ChatEngine:
         Args:
             query: User's question
             chat_history: Previous chat messages (optional, memory is maintained internally)
-            
+        
         Returns:
             Dictionary with answer and sources
         """
+        for _ in self.stream_response(query, chat_history):
+            pass
+        return dict(self.last_response)
+    
+    def stream_response(self, query: str, chat_history: List[Dict] = None) -> Iterator[str]:
+        """
+        Stream Claude's response to the user's query as it is generated.
+        
+        Once the generator is exhausted, ``last_response`` holds the
+        dictionary with the full answer and sources.
+        
+        Args:
+            query: User's question
+            chat_history: Previous chat messages (optional, memory is maintained internally)
+        
+        Yields:
+            Pieces of the answer text
+        """
         try:
-            # Get response from chain
-            response = self.chain({"question": query})
+            query_vector = self.vector_store.embeddings.embed_query(query)
+            history = self.memory.load_memory_variables({})["chat_history"]
+            
+            # Answers only depend on the question alone at the start of a conversation;
+            # follow-ups like "what about the second one?" depend on the history too
+            cached = self.response_cache.lookup(query_vector) if not history else None
+            if cached is not None:
+                # Keep the conversation history consistent with what the user saw
+                self.memory.save_context({"question": query}, {"answer": cached["answer"]})
+                self.last_response = dict(cached)
+                yield cached["answer"]
+                return
+            
+            # Retrieve with the vector already computed for the cache lookup
+            if self.embeddings_manager is not None:
+                docs = self.embeddings_manager.similarity_search_by_vector(self.vector_store, query_vector, k=RETRIEVAL_K)
+            else:
+                docs = self.vector_store.similarity_search_by_vector(query_vector, k=RETRIEVAL_K)
+            context = "\n\n".join(doc.page_content for doc in docs)
+            messages = [
+                SystemMessage(content=SYSTEM_PROMPT.format(context=context)),
+                *history,
+                HumanMessage(content=query)
+            ]
+            
+            # Single Claude call per turn, streamed as it is generated
+            answer_parts = []
+            for chunk in self.llm.stream(messages):
+                if isinstance(chunk.content, str) and chunk.content:
+                    answer_parts.append(chunk.content)
+                    yield chunk.content
+            answer = "".join(answer_parts)
+            self.memory.save_context({"question": query}, {"answer": answer})
             
             # Extract source information
-            sources = []
-            if response.get("source_documents"):
-                for doc in response["source_documents"]:
-                    source_info = doc.metadata.get("source", "Unknown")
-                    page = doc.metadata.get("page", "N/A")
-                    content_preview = doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-                    sources.append(f"{source_info} (Page {page})\n{content_preview}")
+            sources = [_format_source(doc) for doc in docs]
             
-            return {
-                "answer": response["answer"],
+            result = {
+                "answer": answer,
                 "sources": sources
             }
-            
+            if not history:
+                self.response_cache.add(query_vector, result)
+            self.last_response = dict(result)
+        
         except Exception as e:
             raise Exception(f"Error generating response: {str(e)}")
     
-    def update_settings(self, temperature: float = None, max_tokens: int = None, model: str = None):
+    def update_settings(self, temperature: float = None, max_tokens: int = None, model: str = None, cache_threshold: float = None):
         """
         Update chat engine settings.
         
@@ -91,40 +164,36 @@ class ChatEngine:
             temperature: New temperature value (0.0 to 1.0)
             max_tokens: New max tokens value
             model: New Claude model to use
+            cache_threshold: New cosine similarity threshold for cached answers
         """
-        recreate_llm = False
-        
-        if temperature is not None and temperature != self.temperature:
-            self.temperature = temperature
-            recreate_llm = True
-        
-        if max_tokens is not None and max_tokens != self.max_tokens:
-            self.max_tokens = max_tokens
-            recreate_llm = True
-        
-        if model is not None and model != self.model:
-            self.model = model
-            recreate_llm = True
-        
-        # Recreate LLM if settings changed
-        if recreate_llm:
-            api_key = os.getenv("ANTHROPIC_API_KEY")
-            self.llm = ChatAnthropic(
-                model=self.model,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                anthropic_api_key=api_key
-            )
-            
-            # Recreate chain with new LLM
-            self.chain = ConversationalRetrievalChain.from_llm(
-                llm=self.llm,
-                retriever=self.vector_store.as_retriever(search_kwargs={"k": 4}),
-                memory=self.memory,
-                return_source_documents=True,
-                verbose=False
-            )
+        if cache_threshold is not None:
+            self.response_cache.threshold = cache_threshold
+        
+        settings = (
+            self.temperature if temperature is None else temperature,
+            self.max_tokens if max_tokens is None else max_tokens,
+            self.model if model is None else model
+        )
+        
+        # Streamlit calls this on every rerun; nothing to do if nothing changed
+        if settings == self._last_settings:
+            return
+        
+        model_changed = settings[2] != self.model
+        self.temperature, self.max_tokens, self.model = settings
+        self._last_settings = settings
+        
+        # Cached answers came from the previous model or sampling settings
+        self.response_cache.clear()
+        
+        if model_changed:
+            # A different model needs a new client
+            self._create_llm()
+        else:
+            # Sampling settings are bound as per-call overrides on the existing client
+            self.llm = self.client.bind(temperature=self.temperature, max_tokens=self.max_tokens)
     
     def clear_memory(self):
-        """Clear conversation memory."""
+        """Clear conversation memory and cached answers."""
         self.memory.clear()
+        self.response_cache.clear()
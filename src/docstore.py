@@ -0,0 +1,119 @@
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+import json
+import os
+import pyarrow as pa
+
+
+class ArrowDocstore(Docstore, AddableMixin):
+    """Docstore backed by a memory-mapped Arrow IPC file, read one row at a time."""
+    
+    def __init__(self, table: pa.Table):
+        """
+        Wrap a table with id, text and metadata columns.
+        
+        Documents are only built when searched for; documents added later
+        are kept in memory alongside the table.
+        
+        Args:
+            table: Table read by ArrowDocstore.load
+        """
+        self._text = table.column("text")
+        self._metadata = table.column("metadata")
+        self._rows = {doc_id: row for row, doc_id in enumerate(table.column("id").to_pylist())}
+        self._added: Dict[str, Document] = {}
+    
+    def search(self, search: str) -> Union[str, Document]:
+        """
+        Get a document by ID.
+        
+        Args:
+            search: Document ID
+        
+        Returns:
+            The document, or a message string if the ID is unknown (as InMemoryDocstore does)
+        """
+        if search in self._added:
+            return self._added[search]
+        
+        row = self._rows.get(search)
+        if row is None:
+            return f"ID {search} not found."
+        return Document(
+            id=search,
+            page_content=self._text[row].as_py(),
+            metadata=json.loads(self._metadata[row].as_py())
+        )
+    
+    def add(self, texts: Dict[str, Document]) -> None:
+        """
+        Add documents in memory.
+        
+        Args:
+            texts: Documents keyed by ID
+        """
+        overlapping = set(texts).intersection(self._rows).union(set(texts).intersection(self._added))
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+    
+    def delete(self, ids: List) -> None:
+        """
+        Remove documents by ID.
+        
+        Args:
+            ids: Document IDs
+        """
+        missing = set(ids).difference(self._rows).difference(self._added)
+        if missing:
+            raise ValueError(f"Tried to delete ids that do not exist: {missing}")
+        for doc_id in ids:
+            self._rows.pop(doc_id, None)
+            self._added.pop(doc_id, None)
+    
+    @staticmethod
+    def write(path: Path, docstore: Docstore, index_to_docstore_id: Dict[int, str]):
+        """
+        Write the documents of a vector store to an Arrow IPC file.
+        
+        The file is written next to the target and renamed over it, so
+        stores memory-mapping the previous file keep reading valid data.
+        
+        Args:
+            path: Target file
+            docstore: Docstore holding every ID in index_to_docstore_id
+            index_to_docstore_id: FAISS row to document ID mapping
+        """
+        docs = [docstore.search(doc_id) for doc_id in index_to_docstore_id.values()]
+        table = pa.table({
+            "index": pa.array(list(index_to_docstore_id), type=pa.int64()),
+            "id": pa.array(list(index_to_docstore_id.values()), type=pa.string()),
+            "text": pa.array([doc.page_content for doc in docs], type=pa.large_string()),
+            "metadata": pa.array([json.dumps(doc.metadata, default=str) for doc in docs], type=pa.string())
+        })
+        
+        temp_path = path.with_name(path.name + ".tmp")
+        with pa.OSFile(str(temp_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temp_path, path)
+    
+    @classmethod
+    def load(cls, path: Path) -> Tuple["ArrowDocstore", Dict[int, str]]:
+        """
+        Memory-map an Arrow docstore file.
+        
+        Only the ID columns are read into Python objects; text and metadata
+        stay in the mapped file until a document is searched for.
+        
+        Args:
+            path: File written by ArrowDocstore.write
+        
+        Returns:
+            The docstore and the FAISS row to document ID mapping
+        """
+        table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+        index_to_docstore_id = dict(zip(table.column("index").to_pylist(), table.column("id").to_pylist()))
+        return cls(table), index_to_docstore_id
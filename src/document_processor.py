@@ -1,29 +1,111 @@
 
-from langchain_community.document_loaders import PyPDFLoader, UnstructuredExcelLoader
+from langchain_community.document_loaders import PyMuPDFLoader, UnstructuredExcelLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List
+from langchain_core.embeddings import Embeddings
+from langchain_experimental.text_splitter import SemanticChunker
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+from itertools import chain
+from typing import List, Optional
+import numpy as np
 import os
 
 
+# Documents larger than this are split by size; embedding every sentence would be too slow
+MAX_SEMANTIC_DOCUMENT_CHARS = 1_000_000
+
+# Chunks whose 64-bit SimHash fingerprints differ in at most this many bits are duplicates
+SIMHASH_MAX_DISTANCE = 3
+SIMHASH_SHINGLE_WORDS = 5
+SIMHASH_BANDS = 4
+
+
+def _simhash(text: str) -> int:
+    """
+    Compute a 64-bit SimHash fingerprint over the word 5-grams of a text.
+    
+    Args:
+        text: Text to fingerprint
+        
+    Returns:
+        Fingerprint whose Hamming distance approximates text dissimilarity
+    """
+    words = text.lower().split()
+    shingles = {
+        " ".join(words[i:i + SIMHASH_SHINGLE_WORDS])
+        for i in range(max(1, len(words) - SIMHASH_SHINGLE_WORDS + 1))
+    }
+    hashes = np.array(
+        [blake2b(shingle.encode(), digest_size=8, usedforsecurity=False).digest() for shingle in shingles],
+        dtype='S8'
+    )
+    
+    # Each bit is set when the majority of shingle hashes have it set
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1)
+    majority = np.packbits(bits.sum(axis=0) * 2 > len(hashes))
+    return int.from_bytes(majority.tobytes(), "big")
+
+
+def _load_file(file_path: str) -> List:
+    """
+    Load a single PDF or Excel file.
+    
+    Args:
+        file_path: Path of the file to load
+        
+    Returns:
+        List of loaded documents (empty for unsupported file types)
+    """
+    try:
+        file_extension = os.path.splitext(file_path)[1].lower()
+        
+        if file_extension == '.pdf':
+            loader = PyMuPDFLoader(file_path)
+            return loader.load()
+            
+        elif file_extension in ['.xlsx', '.xls']:
+            loader = UnstructuredExcelLoader(file_path, mode="elements")
+            return loader.load()
+            
+        else:
+            print(f"Unsupported file type: {file_extension}")
+            return []
+            
+    except Exception as e:
+        print(f"Error loading {file_path}: {str(e)}")
+        raise
+
+
 class DocumentProcessor:
     """Handles loading and processing of PDF and Excel documents."""
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, embeddings: Optional[Embeddings] = None, deduplicate: bool = True):
         """
         Initialize the document processor.
         
         Args:
             chunk_size: Size of text chunks for splitting
             chunk_overlap: Overlap between chunks
+            embeddings: Optional embeddings model; when given, chunks are split
+                        where the meaning of adjacent sentences shifts
+            deduplicate: Drop near-duplicate chunks (e.g. from overlapping uploads)
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.deduplicate = deduplicate
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             length_function=len,
             separators=["\n\n", "\n", " ", ""]
         )
+        self.semantic_splitter = None
+        if embeddings is not None:
+            self.semantic_splitter = SemanticChunker(
+                embeddings,
+                breakpoint_threshold_type='percentile',
+                breakpoint_threshold_amount=85
+            )
     
     def load_documents(self, file_paths: List[str]) -> List:
         """
@@ -35,28 +117,13 @@ class DocumentProcessor:
         Returns:
             List of loaded documents
         """
-        documents = []
+        if not file_paths:
+            return []
         
-        for file_path in file_paths:
-            try:
-                file_extension = os.path.splitext(file_path)[1].lower()
-                
-                if file_extension == '.pdf':
-                    loader = PyPDFLoader(file_path)
-                    docs = loader.load()
-                    documents.extend(docs)
-                    
-                elif file_extension in ['.xlsx', '.xls']:
-                    loader = UnstructuredExcelLoader(file_path, mode="elements")
-                    docs = loader.load()
-                    documents.extend(docs)
-                    
-                else:
-                    print(f"Unsupported file type: {file_extension}")
-                    
-            except Exception as e:
-                print(f"Error loading {file_path}: {str(e)}")
-                raise
+        # Files are parsed concurrently; map() keeps results in input order
+        max_workers = min(8, os.cpu_count() or 1, len(file_paths))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            documents = list(chain.from_iterable(pool.map(_load_file, file_paths)))
         
         return documents
     
@@ -70,9 +137,60 @@ class DocumentProcessor:
         Returns:
             List of document chunks
         """
-        chunks = self.text_splitter.split_documents(documents)
+        if self.semantic_splitter is None:
+            chunks = self.text_splitter.split_documents(documents)
+        else:
+            # Documents are split one at a time, so PDF chunks never cross a page boundary
+            chunks = []
+            for document in documents:
+                if len(document.page_content) > MAX_SEMANTIC_DOCUMENT_CHARS:
+                    chunks.extend(self.text_splitter.split_documents([document]))
+                else:
+                    semantic_chunks = self.semantic_splitter.split_documents([document])
+                    # Cap semantic chunks at chunk_size so they fit the embedding model's input
+                    chunks.extend(self.text_splitter.split_documents(semantic_chunks))
+        
+        if self.deduplicate:
+            chunks = self.deduplicate_chunks(chunks)
         return chunks
     
+    def deduplicate_chunks(self, chunks: List) -> List:
+        """
+        Remove chunks that are near-duplicates of an earlier chunk.
+        
+        Args:
+            chunks: List of document chunks
+            
+        Returns:
+            Chunks in their original order, keeping the first of each duplicate group
+        """
+        # Fingerprints within SIMHASH_MAX_DISTANCE bits agree exactly on at least
+        # one of the 16-bit bands, so only chunks sharing a band are compared
+        band_bits = 64 // SIMHASH_BANDS
+        band_mask = (1 << band_bits) - 1
+        buckets = [{} for _ in range(SIMHASH_BANDS)]
+        
+        unique_chunks = []
+        for chunk in chunks:
+            fingerprint = _simhash(chunk.page_content)
+            bands = [(fingerprint >> (band * band_bits)) & band_mask for band in range(SIMHASH_BANDS)]
+            
+            is_duplicate = any(
+                bin(fingerprint ^ other).count("1") <= SIMHASH_MAX_DISTANCE
+                for bucket, band in zip(buckets, bands)
+                for other in bucket.get(band, ())
+            )
+            if is_duplicate:
+                continue
+            
+            for bucket, band in zip(buckets, bands):
+                bucket.setdefault(band, []).append(fingerprint)
+            unique_chunks.append(chunk)
+        
+        if len(unique_chunks) < len(chunks):
+            print(f"Removed {len(chunks) - len(unique_chunks)} duplicate chunks")
+        return unique_chunks
+    
     def process_documents(self, file_paths: List[str]) -> List:
         """
         Complete pipeline: load and split documents.
@@ -1,14 +1,189 @@
 
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
-from typing import List, Optional
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from sentence_transformers.util import batch_to_device
+from contextlib import nullcontext, suppress
+from functools import lru_cache
+from hashlib import blake2b, sha256
+from pathlib import Path
+from typing import List, Optional, Tuple
+from weakref import WeakKeyDictionary, WeakSet
+import numpy as np
+import asyncio
+import faiss
+import importlib.util
+import json
+import math
 import os
+import pickle
+import shutil
+import threading
+import uuid
+import torch
+
+from src.docstore import ArrowDocstore
+from src.semantic_cache import SemanticCache
+
+
+# Root directory for on-disk embedding and index caches; set CHATBOT_CACHE_DIR
+# to move it. Everything under it can be deleted at any time and is rebuilt on demand
+CACHE_DIR = Path(os.getenv("CHATBOT_CACHE_DIR", "cache"))
+
+# Disk budgets per model for cached query and chunk vectors, and for all cached
+# indexes; least recently used entries are deleted once a cache outgrows its budget
+QUERY_CACHE_MAX_BYTES = 64 * 1024 ** 2
+EMBEDDING_CACHE_MAX_BYTES = 2 * 1024 ** 3
+INDEX_CACHE_MAX_BYTES = 4 * 1024 ** 3
+
+# Documents of a saved vector store, next to its index.faiss
+DOCSTORE_FILE = "docstore.arrow"
+
+
+# Index types accepted by create_vector_store
+INDEX_TYPES = ("flat", "sq8", "hnsw", "ivfpq")
+
+# Corpora above this size are searched through an HNSW graph instead of an exhaustive scan
+HNSW_MIN_CHUNKS = 5_000
+
+# HNSW graph parameters (neighbors per node, build-time and query-time beam width)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Corpora above this size are stored as IVF-PQ codes instead of raw float32 vectors
+IVFPQ_MIN_CHUNKS = 10_000
+IVFPQ_SUBQUANTIZERS = 48
+IVFPQ_NBITS = 8
+IVFPQ_NPROBE = 16
+
+# acreate_vector_store packs length-sorted chunks into batches of at most this many
+# padded tokens and chunks, and encodes this many batches at a time
+ASYNC_BATCH_TOKENS = 32_768
+ASYNC_BATCH_SIZE = 128
+ASYNC_EMBED_CONCURRENCY = 4
+
+# Search results are reused for paraphrased queries at least this similar
+SEARCH_CACHE_THRESHOLD = 0.97
+SEARCH_CACHE_SIZE = 256
+
+# Candidates fetched per requested result when a filter cannot be applied inside the index
+FILTER_FETCH_FACTOR = 50
+# Largest k FAISS GPU indexes can search for
+GPU_MAX_K = 2048
+
+
+def _prune_cache(directory: Path, max_bytes: int, keep: Optional[Path] = None):
+    """
+    Delete the least recently used entries of a cache directory until it fits in max_bytes.
+    
+    Entries are the directory's files and subdirectories. Cache hits refresh
+    an entry's modification time, so the entries unused for longest go first.
+    
+    Args:
+        directory: Cache directory
+        max_bytes: Size the directory is pruned down to
+        keep: Entry never deleted, such as the one just written
+    """
+    try:
+        children = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    
+    entries = []
+    for entry in children:
+        if keep is not None and entry.name == keep.name:
+            continue
+        try:
+            if entry.is_dir():
+                stats = [path.stat() for path in Path(entry.path).rglob("*") if path.is_file()]
+            else:
+                stats = [entry.stat()]
+        except FileNotFoundError:
+            # Pruned by another thread meanwhile
+            continue
+        entries.append((max((stat.st_mtime for stat in stats), default=0), sum(stat.st_size for stat in stats), entry))
+    
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries, key=lambda item: item[0]):
+        if total <= max_bytes:
+            break
+        # Stores memory-mapping a deleted index keep their mapping
+        if entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            with suppress(FileNotFoundError):
+                os.remove(entry.path)
+        total -= size
+
+
+def _cosine_relevance_score(score: float) -> float:
+    """Relevance of an inner-product score between normalized vectors, i.e. cosine similarity."""
+    return score
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that memoizes query vectors in memory and on disk."""
+    
+    def __init__(self, embeddings: Embeddings, cache_dir: Path, maxsize: int = 1024, lock=None, load_model=None):
+        """
+        Wrap an embeddings model with a query cache.
+        
+        Args:
+            embeddings: Underlying LangChain embeddings model
+            cache_dir: Directory holding one .npy file per cached query
+            maxsize: Number of query vectors kept in memory
+            lock: Held while the model runs, so it is not moved between devices mid-call
+            load_model: Called before embedding documents, to bring a released model back to the GPU
+        """
+        self.embeddings = embeddings
+        self.cache_dir = cache_dir
+        self.lock = lock if lock is not None else nullcontext()
+        self.load_model = load_model
+        self._cached_query = lru_cache(maxsize=maxsize)(self._embed_query)
+        self._prune_every = maxsize
+        self._writes = 0
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents with the underlying model (no caching)."""
+        with self.lock:
+            # Ingest (e.g. semantic chunking) starts here, before any bulk encode
+            if self.load_model is not None:
+                self.load_model()
+            return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing the vector of any previously seen identical query."""
+        return list(self._cached_query(text))
+    
+    def _embed_query(self, text: str) -> Tuple[float, ...]:
+        path = self.cache_dir / f"{sha256(text.encode()).hexdigest()}.npy"
+        try:
+            vector = np.load(path)
+            os.utime(path)
+            return tuple(vector.tolist())
+        except FileNotFoundError:
+            pass
+        
+        with self.lock:
+            vector = self.embeddings.embed_query(text)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        np.save(path, np.asarray(vector, dtype='float32'))
+        
+        # Scanning the directory on every query would cost more than the lookup saves
+        self._writes += 1
+        if self._writes % self._prune_every == 0:
+            _prune_cache(self.cache_dir, QUERY_CACHE_MAX_BYTES)
+        return tuple(vector)
 
 
 class EmbeddingsManager:
     """Manages embeddings and vector store operations using open-source models."""
     
-    def __init__(self, model: str = "sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, model: str = "sentence-transformers/all-MiniLM-L6-v2", backend: str = "auto"):
         """
         Initialize the embeddings manager with HuggingFace embeddings.
         Uses free, open-source embedding models - no API key required!
@@ -19,59 +194,711 @@ class EmbeddingsManager:
                    - "sentence-transformers/all-MiniLM-L6-v2" (fast, good quality)
                    - "sentence-transformers/all-mpnet-base-v2" (better quality, slower)
                    - "BAAI/bge-small-en-v1.5" (good for retrieval)
+            backend: Inference backend
+                   - "torch": PyTorch (fp16 on GPU)
+                   - "onnx": ONNX Runtime with int8 weights (CPU only)
+                   - "auto": torch on GPU, onnx on CPU when optimum is installed
+                     and the model uses mean or CLS pooling
         """
         # No API key needed for HuggingFace embeddings!
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=model,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        requested_backend = backend
+        if backend == "auto":
+            onnx_available = importlib.util.find_spec("optimum") is not None
+            backend = "onnx" if self.device == 'cpu' and onnx_available else "torch"
+        
+        pooling = "mean_tokens"
+        if backend == "onnx":
+            from src.onnx_embeddings import SUPPORTED_POOLING, read_pooling_config
+            pooling, _ = read_pooling_config(model)
+            if requested_backend == "auto" and pooling not in SUPPORTED_POOLING:
+                backend = "torch"
+        self.backend = backend
+        
+        # Caches are per model and backend, since int8 vectors differ slightly
+        # from fp32 ones, and per pooling mode for models not mean-pooled
+        self.model = model
+        self.cache_name = model.replace("/", "__")
+        if backend == "onnx":
+            self.cache_name += "__onnx-int8" + ("" if pooling == "mean_tokens" else f"-{pooling}")
+        
+        if backend == "onnx":
+            from src.onnx_embeddings import ONNXEmbeddings
+            self.device = 'cpu'
+            self.base_embeddings = ONNXEmbeddings(model, cache_dir=CACHE_DIR / "onnx" / self.cache_name)
+        else:
+            self.base_embeddings = HuggingFaceEmbeddings(
+                model_name=model,
+                model_kwargs={'device': self.device},
+                encode_kwargs={'batch_size': 128, 'normalize_embeddings': True}
+            )
+            
+            # Half precision doubles GPU throughput; CPU kernels stay in fp32
+            if self.device == 'cuda':
+                self.base_embeddings.client.half()
+        
+        # The manager is shared by every session, so the torch model is only
+        # moved between devices while no other thread is running it
+        self._model_lock = threading.RLock()
+        
+        # Repeated questions skip the transformer forward pass
+        self.embeddings = CachedQueryEmbeddings(
+            self.base_embeddings,
+            cache_dir=CACHE_DIR / "q_emb" / self.cache_name,
+            lock=self._model_lock if backend == "torch" else None,
+            load_model=self._load_model
         )
-        print(f"✅ Loaded embedding model: {model}")
+        self.embedding_cache_dir = CACHE_DIR / "emb" / self.cache_name
+        
+        # One search result cache per vector store, dropped along with the store
+        self._search_caches = WeakKeyDictionary()
+        
+        # Metadata filter masks per vector store, keyed by filter
+        self._filter_masks = WeakKeyDictionary()
+        
+        # Vector stores whose index is memory-mapped from disk
+        self._mapped_indexes = WeakSet()
+        
+        # FAISS indexes follow the embedding model onto the GPU when faiss-gpu is installed
+        self.gpu_resources = None
+        if self.device == 'cuda' and hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+            self.gpu_resources = faiss.StandardGpuResources()
+        print(f"✅ Loaded embedding model: {model} ({backend}, {self.device})")
     
-    def create_vector_store(self, chunks: List, persist_directory: Optional[str] = None) -> FAISS:
+    def create_vector_store(
+        self,
+        chunks: List,
+        persist_directory: Optional[str] = None,
+        index_type: Optional[str] = None,
+        use_gpu: Optional[bool] = None
+    ) -> FAISS:
         """
         Create a FAISS vector store from document chunks.
         
         Args:
             chunks: List of document chunks
             persist_directory: Optional directory to persist the vector store
-            
+            index_type: "flat", "sq8", "hnsw" or "ivfpq"; chosen from the corpus size if None
+            use_gpu: Build and search the index on the GPU; defaults to doing so when faiss-gpu
+                and a GPU are available
+        
         Returns:
             FAISS vector store
         """
         if not chunks:
             raise ValueError("No chunks provided to create vector store")
         
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        
+        # Reuse the index built for an identical set of chunks, if any
+        use_gpu = self._resolve_use_gpu(use_gpu)
+        index_type = self._resolve_index_type(index_type, len(texts), use_gpu)
+        cache_dir = self._index_cache_dir(texts, metadatas, index_type)
+        if self._is_saved_store(cache_dir):
+            return self._reuse_vector_store(cache_dir, persist_directory, use_gpu)
+        
         print(f"Creating vector store from {len(chunks)} chunks...")
-        vector_store = FAISS.from_documents(
-            documents=chunks,
-            embedding=self.embeddings
+        vectors = self._embed_texts(texts)
+        return self._build_vector_store(texts, metadatas, vectors, index_type, use_gpu, cache_dir, persist_directory)
+    
+    async def acreate_vector_store(
+        self,
+        chunks: List,
+        persist_directory: Optional[str] = None,
+        index_type: Optional[str] = None,
+        use_gpu: Optional[bool] = None
+    ) -> FAISS:
+        """
+        Create a FAISS vector store, encoding batches of new chunks concurrently.
+        
+        Batches are sized by token count, so short chunks are encoded in large
+        batches and long ones in small batches of similar padded size. Each
+        batch is padded and encoded in a worker thread; the model releases the
+        GIL during its forward pass, so batches overlap padding and inference.
+        
+        Args:
+            chunks: List of document chunks
+            persist_directory: Directory to save the vector store (optional)
+            index_type: "flat", "sq8", "hnsw" or "ivfpq"; chosen from the corpus size if None
+            use_gpu: Build and search the index on the GPU; defaults to doing so when faiss-gpu
+                and a GPU are available
+        
+        Returns:
+            FAISS vector store
+        """
+        if not chunks:
+            raise ValueError("No chunks provided to create vector store")
+        
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        
+        use_gpu = self._resolve_use_gpu(use_gpu)
+        index_type = self._resolve_index_type(index_type, len(texts), use_gpu)
+        cache_dir = self._index_cache_dir(texts, metadatas, index_type)
+        if self._is_saved_store(cache_dir):
+            return self._reuse_vector_store(cache_dir, persist_directory, use_gpu)
+        
+        print(f"Creating vector store from {len(chunks)} chunks...")
+        unique_texts, inverse = self._dedupe_texts(texts)
+        paths, vectors, missing = self._lookup_embeddings(unique_texts)
+        if missing:
+            # Tokenized once; the token counts size the batches and the IDs feed the model
+            encodings = await asyncio.to_thread(self._tokenize, [unique_texts[i] for i in missing])
+            batches = self._pack_batches([len(ids) for ids in encodings["input_ids"]])
+            semaphore = asyncio.Semaphore(ASYNC_EMBED_CONCURRENCY)
+            
+            async def encode(rows: List[int]) -> np.ndarray:
+                async with semaphore:
+                    return await asyncio.to_thread(self._encode_features, self._batch_features(encodings, rows))
+            
+            encoded = await asyncio.gather(*(encode(rows) for rows in batches))
+            order = [missing[row] for rows in batches for row in rows]
+            self._store_embeddings(paths, vectors, order, np.concatenate(encoded))
+        
+        return self._build_vector_store(
+            texts,
+            metadatas,
+            np.asarray(vectors, dtype='float32')[inverse],
+            index_type,
+            use_gpu,
+            cache_dir,
+            persist_directory
+        )
+    
+    def _reuse_vector_store(self, cache_dir: Path, persist_directory: Optional[str], use_gpu: bool) -> FAISS:
+        """Load the cached index for an already embedded chunk set."""
+        print(f"Reusing cached vector store from {cache_dir}...")
+        vector_store = self.load_vector_store(str(cache_dir), use_gpu=use_gpu)
+        # Mark the index as recently used, so pruning keeps it
+        os.utime(cache_dir / "index.faiss")
+        if persist_directory:
+            self._save_vector_store(vector_store, persist_directory)
+            print(f"✅ Vector store saved to {persist_directory}")
+        self.release_model_memory()
+        return vector_store
+    
+    def _build_vector_store(
+        self,
+        texts: List[str],
+        metadatas: List[dict],
+        vectors: np.ndarray,
+        index_type: str,
+        use_gpu: bool,
+        cache_dir: Path,
+        persist_directory: Optional[str]
+    ) -> FAISS:
+        """
+        Index precomputed vectors and save the store to the cache.
+        
+        Args:
+            texts: Chunk texts
+            metadatas: Chunk metadata
+            vectors: float32 matrix with one row per text
+            index_type: "flat", "sq8", "hnsw" or "ivfpq"
+            use_gpu: Whether to move the index to the GPU
+            cache_dir: Cache directory keyed by the chunk set
+            persist_directory: Directory to save the vector store (optional)
+        
+        Returns:
+            FAISS vector store
+        """
+        index = self._build_index(vectors, index_type, use_gpu)
+        
+        ids = [str(uuid.uuid4()) for _ in texts]
+        docstore = InMemoryDocstore({
+            doc_id: Document(id=doc_id, page_content=text, metadata=metadata)
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        })
+        vector_store = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=dict(enumerate(ids)),
+            # Vectors are normalized, so inner product is cosine similarity
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+            relevance_score_fn=_cosine_relevance_score
         )
         
+        self._save_vector_store(vector_store, str(cache_dir))
+        _prune_cache(cache_dir.parent, INDEX_CACHE_MAX_BYTES, keep=cache_dir)
         if persist_directory:
-            vector_store.save_local(persist_directory)
+            self._save_vector_store(vector_store, persist_directory)
             print(f"✅ Vector store saved to {persist_directory}")
         
+        self.release_model_memory()
         return vector_store
     
-    def load_vector_store(self, persist_directory: str) -> FAISS:
+    def release_model_memory(self):
+        """
+        Move the embedding model off the GPU once bulk encoding is done.
+        
+        After ingest only single queries are embedded, which CPU handles well,
+        so holding the model in VRAM for the rest of the session is wasted.
+        Queries then run on the CPU in fp32; sentence-transformers 3.0+
+        encodes on whatever device the model is on, so they do not pull it
+        back. The model moves back to the GPU, in fp16, on the next document
+        embedding or bulk encode.
+        """
+        if self.backend != "torch" or self.device != 'cuda':
+            return
+        
+        with self._model_lock:
+            model = self.base_embeddings.client
+            if model.device.type == 'cuda':
+                model.to('cpu', dtype=torch.float32)
+                torch.cuda.empty_cache()
+    
+    def _load_model(self):
+        """Move the embedding model back to the GPU after release_model_memory."""
+        if self.backend != "torch" or self.device != 'cuda':
+            return
+        
+        with self._model_lock:
+            model = self.base_embeddings.client
+            if model.device.type != 'cuda':
+                model.to(self.device, dtype=torch.float16)
+    
+    def _save_vector_store(self, vector_store: FAISS, persist_directory: str):
+        """
+        Save a vector store as index.faiss plus an Arrow docstore file,
+        copying GPU indexes back to CPU for serialization.
+        
+        Flat indexes are written as float16 codes, halving the file size and
+        load time; search decodes them on the fly with negligible recall loss.
+        
+        Args:
+            vector_store: FAISS vector store to save
+            persist_directory: Directory to save the vector store to
+        """
+        # A memory-mapped IVF index would be written as a reference to its
+        # mapped file rather than its codes
+        self._load_index_into_memory(vector_store)
+        
+        index = vector_store.index
+        cpu_index = index
+        if self.gpu_resources is not None and isinstance(index, faiss.GpuIndex):
+            cpu_index = faiss.index_gpu_to_cpu(index)
+        if isinstance(cpu_index, faiss.IndexFlat):
+            cpu_index = self._convert_flat_index(cpu_index, faiss.IndexScalarQuantizer(
+                cpu_index.d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+            ))
+        
+        path = Path(persist_directory)
+        path.mkdir(parents=True, exist_ok=True)
+        
+        # The docstore goes first and index.faiss is renamed into place last,
+        # so an interrupted save never leaves an index without its documents.
+        # Both are written beside the target and renamed over it, so stores
+        # memory-mapping the previous files keep reading valid data
+        ArrowDocstore.write(path / DOCSTORE_FILE, vector_store.docstore, vector_store.index_to_docstore_id)
+        
+        index_path = path / "index.faiss"
+        temp_path = path / "index.faiss.tmp"
+        faiss.write_index(cpu_index, str(temp_path))
+        os.replace(temp_path, index_path)
+    
+    @staticmethod
+    def _convert_flat_index(source, target):
+        """Copy every vector of an exhaustive-search index into another flat index."""
+        target.add(source.reconstruct_n(0, source.ntotal))
+        return target
+    
+    def _resolve_use_gpu(self, use_gpu: Optional[bool]) -> bool:
+        """
+        Decide whether indexes go on the GPU.
+        
+        Args:
+            use_gpu: Requested placement, or None to use the GPU whenever available
+        
+        Returns:
+            True if indexes should be moved to the GPU
+        """
+        if use_gpu is None:
+            return self.gpu_resources is not None
+        if use_gpu and self.gpu_resources is None:
+            raise ValueError("use_gpu=True requires faiss-gpu, a CUDA GPU and the torch backend")
+        return use_gpu
+    
+    def _to_gpu(self, index, use_gpu: bool = True):
+        """
+        Move an index to the GPU when faiss-gpu and a GPU are available.
+        
+        Args:
+            index: CPU FAISS index
+            use_gpu: Keep the index on CPU when False
+        
+        Returns:
+            GPU copy of the index, or the index itself if it stays on CPU
+        """
+        if not use_gpu or self.gpu_resources is None:
+            return index
+        if isinstance(index, (faiss.IndexHNSW, faiss.IndexScalarQuantizer)):
+            # HNSW has no GPU implementation, nor do flat scalar-quantized indexes
+            return index
+        return faiss.index_cpu_to_gpu(self.gpu_resources, 0, index)
+    
+    @staticmethod
+    def _is_saved_store(path: Path) -> bool:
+        """Whether a directory holds a complete saved store: the index and its docstore."""
+        return (path / "index.faiss").exists() and (
+            (path / DOCSTORE_FILE).exists() or (path / "index.pkl").exists()
+        )
+    
+    def _index_cache_dir(self, texts: List[str], metadatas: List[dict], index_type: str) -> Path:
+        """Cache directory for the index of a chunk set, kept apart per index type."""
+        return CACHE_DIR / "faiss" / f"{self._corpus_key(texts, metadatas)}-{index_type}"
+    
+    def _corpus_key(self, texts: List[str], metadatas: List[dict]) -> str:
+        """
+        Compute an order-independent cache key for a set of chunks.
+        
+        Args:
+            texts: Chunk texts
+            metadatas: Chunk metadata, part of the key since it is stored in the index
+        
+        Returns:
+            Hex digest identifying the model, backend and chunk set
+        """
+        chunk_digests = sorted(
+            sha256(text.encode() + json.dumps(metadata, sort_keys=True, default=str).encode()).digest()
+            for text, metadata in zip(texts, metadatas)
+        )
+        return sha256(self.cache_name.encode() + b''.join(chunk_digests)).hexdigest()
+    
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts, reusing vectors cached on disk and encoding only new texts.
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            float32 matrix of shape (len(texts), dim)
+        """
+        unique_texts, inverse = self._dedupe_texts(texts)
+        paths, vectors, missing = self._lookup_embeddings(unique_texts)
+        if missing:
+            encoded = self.encode_bulk([unique_texts[i] for i in missing])
+            self._store_embeddings(paths, vectors, missing, encoded)
+        
+        return np.asarray(vectors, dtype='float32')[inverse]
+    
+    def _dedupe_texts(self, texts: List[str]) -> Tuple[List[str], np.ndarray]:
+        """
+        Collapse repeated texts, such as PDF headers and footers, so each is encoded once.
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            Distinct texts in first-seen order, and for each input text the
+            position of its copy among them
+        """
+        unique_texts = []
+        positions = {}
+        inverse = np.empty(len(texts), dtype='int64')
+        for i, text in enumerate(texts):
+            # An 8-byte key keeps collisions improbable: by the birthday bound n²/2**65,
+            # about 2.7e-8 at a million chunks
+            key = blake2b(text.encode(), digest_size=8, usedforsecurity=False).digest()
+            position = positions.get(key)
+            if position is None:
+                position = positions[key] = len(unique_texts)
+                unique_texts.append(text)
+            inverse[i] = position
+        return unique_texts, inverse
+    
+    def _lookup_embeddings(self, texts: List[str]) -> Tuple[List[Path], List, List[int]]:
+        """
+        Load the cached vector of each text.
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            Cache paths, vectors (None where not cached) and indices of the
+            uncached texts
+        """
+        # Cached vectors are stored as float16, halving disk I/O
+        paths = [self.embedding_cache_dir / f"{sha256(text.encode()).hexdigest()}.f16.npy" for text in texts]
+        vectors = []
+        for path in paths:
+            try:
+                vectors.append(np.load(path))
+                # Mark the vector as recently used, so pruning keeps it
+                os.utime(path)
+            except FileNotFoundError:
+                vectors.append(None)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        return paths, vectors, missing
+    
+    def _pack_batches(self, token_counts: List[int]) -> List[List[int]]:
+        """
+        Greedily group texts, in token-count order, into batches that fit the token budget.
+        
+        A batch costs its size times its longest text, since shorter texts
+        are padded to that length.
+        
+        Args:
+            token_counts: Number of tokens in each text
+        
+        Returns:
+            Batches of text positions covering all texts
+        """
+        batches = []
+        batch = []
+        longest = 0
+        for row in sorted(range(len(token_counts)), key=token_counts.__getitem__):
+            count = token_counts[row]
+            padded = (len(batch) + 1) * max(longest, count)
+            if batch and (padded > ASYNC_BATCH_TOKENS or len(batch) == ASYNC_BATCH_SIZE):
+                batches.append(batch)
+                batch = []
+                longest = 0
+            batch.append(row)
+            longest = max(longest, count)
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _store_embeddings(self, paths: List[Path], vectors: List, missing: List[int], encoded: np.ndarray):
+        """Fill in newly encoded vectors and write them to the cache."""
+        self.embedding_cache_dir.mkdir(parents=True, exist_ok=True)
+        for i, vector in zip(missing, encoded):
+            np.save(paths[i], np.asarray(vector, dtype='float16'))
+            vectors[i] = vector
+        _prune_cache(self.embedding_cache_dir, EMBEDDING_CACHE_MAX_BYTES)
+    
+    def encode_bulk(self, texts: List[str], batch_size: int = 128) -> np.ndarray:
+        """
+        Encode many texts with one tokenizer call and one forward pass per batch.
+        
+        Bypasses LangChain's per-call embedding path. Texts are batched in
+        token-count order so each batch pads as little as possible.
+        
+        Args:
+            texts: Texts to encode
+            batch_size: Number of texts per forward pass
+        
+        Returns:
+            float32 matrix of normalized embeddings, one row per text
+        """
+        encodings = self._tokenize(texts)
+        order = np.argsort([len(ids) for ids in encodings["input_ids"]], kind="stable")
+        encoded = np.concatenate([
+            self._encode_features(self._batch_features(encodings, order[start:start + batch_size]))
+            for start in range(0, len(texts), batch_size)
+        ])
+        
+        vectors = np.empty_like(encoded)
+        vectors[order] = encoded
+        return vectors
+    
+    def _tokenize(self, texts: List[str]):
+        """
+        Tokenize texts without padding, preprocessed and truncated as the backend does for queries.
+        
+        Args:
+            texts: Texts to tokenize
+        
+        Returns:
+            Tokenizer output holding one list of token IDs per text
+        """
+        if self.backend == "onnx":
+            tokenizer, max_length = self.base_embeddings.tokenizer, self.base_embeddings.max_length
+            texts = [text.replace("\n", " ") for text in texts]
+        else:
+            # Same preprocessing as HuggingFaceEmbeddings and SentenceTransformer.tokenize,
+            # so vectors match embed_query
+            model = self.base_embeddings.client
+            tokenizer, max_length = model.tokenizer, model.max_seq_length
+            texts = [text.replace("\n", " ").strip() for text in texts]
+            if getattr(model[0], "do_lower_case", False):
+                texts = [text.lower() for text in texts]
+        return tokenizer(texts, truncation=True, max_length=max_length)
+    
+    @staticmethod
+    def _batch_features(encodings, rows) -> dict:
+        """Select the tokenized texts at the given positions."""
+        return {key: [values[row] for row in rows] for key, values in encodings.items()}
+    
+    def _encode_features(self, features: dict) -> np.ndarray:
+        """
+        Pad one batch of tokenized texts and run it through the model.
+        
+        Args:
+            features: Unpadded tokenizer output for the batch
+        
+        Returns:
+            float32 matrix of normalized embeddings, one row per text
+        """
+        if self.backend == "onnx":
+            padded = self.base_embeddings.tokenizer.pad(features, return_tensors="np")
+            return self.base_embeddings.embed_features(padded).astype('float32')
+        
+        model = self.base_embeddings.client
+        padded = model.tokenizer.pad(features, return_tensors="pt")
+        # Padding overlaps across threads; placement and the forward pass do not
+        with torch.inference_mode(), self._model_lock:
+            self._load_model()
+            vectors = model(batch_to_device(padded, model.device))["sentence_embedding"]
+            return torch.nn.functional.normalize(vectors, dim=1).float().cpu().numpy()
+    
+    def _resolve_index_type(self, index_type: Optional[str], n: int, use_gpu: bool) -> str:
+        """
+        Validate a requested index type, or pick one for a corpus of n chunks.
+        
+        Small corpora are searched exactly, which is sub-millisecond at that
+        size; mid-sized ones get an HNSW graph for logarithmic search (exact
+        on GPU); large ones are product-quantized so each vector is stored as
+        a few bytes of codes.
+        """
+        if index_type is not None:
+            if index_type not in INDEX_TYPES:
+                raise ValueError(f"Unsupported index type: {index_type}")
+            return index_type
+        
+        if n > IVFPQ_MIN_CHUNKS:
+            return "ivfpq"
+        if n <= HNSW_MIN_CHUNKS or use_gpu:
+            # HNSW cannot run on the GPU, where exact search over mid-sized corpora is faster anyway
+            return "flat"
+        return "hnsw"
+    
+    def _build_index(self, vectors: np.ndarray, index_type: str, use_gpu: bool):
+        """
+        Build a FAISS index over the chunk vectors.
+        
+        Embeddings are normalized, so every index type searches by inner
+        product, which equals cosine similarity.
+        
+        Args:
+            vectors: float32 matrix of shape (n_chunks, dim)
+            index_type: "flat" (exact), "sq8" (exact over int8 codes), "hnsw" (graph)
+                or "ivfpq" (quantized)
+            use_gpu: Build flat and IVF-PQ indexes on the GPU
+        
+        Returns:
+            Trained FAISS index containing all vectors
+        """
+        n, dim = vectors.shape
+        
+        if index_type == "ivfpq":
+            if n < 2 ** IVFPQ_NBITS:
+                raise ValueError(f"IVF-PQ needs at least {2 ** IVFPQ_NBITS} chunks to train, got {n}")
+            # Largest sub-quantizer count that divides the embedding dimension
+            m = next(m for m in range(IVFPQ_SUBQUANTIZERS, 0, -1) if dim % m == 0)
+            nlist = min(4096, 4 * int(math.sqrt(n)))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = self._to_gpu(
+                faiss.IndexIVFPQ(quantizer, dim, nlist, m, IVFPQ_NBITS, faiss.METRIC_INNER_PRODUCT),
+                use_gpu
+            )
+            index.train(vectors)
+            index.add(vectors)
+            index.nprobe = IVFPQ_NPROBE
+            return index
+        
+        if index_type == "flat":
+            index = self._to_gpu(faiss.IndexFlatIP(dim), use_gpu)
+            index.add(vectors)
+            return index
+        
+        if index_type == "sq8":
+            # One byte per dimension, a quarter of float32; stays on CPU as
+            # faiss-gpu has no flat scalar-quantized index
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.add(vectors)
+            return index
+        
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            index.add(vectors)
+            return index
+        
+        raise ValueError(f"Unsupported index type: {index_type}")
+    
+    def load_vector_store(self, persist_directory: str, use_gpu: Optional[bool] = None) -> FAISS:
         """
         Load a persisted FAISS vector store.
         
         Args:
             persist_directory: Directory where vector store is saved
-            
+            use_gpu: Search the index on the GPU; defaults to doing so when available
+        
         Returns:
             Loaded FAISS vector store
         """
-        vector_store = FAISS.load_local(
-            persist_directory,
-            self.embeddings,
-            allow_dangerous_deserialization=True
+        use_gpu = self._resolve_use_gpu(use_gpu)
+        path = Path(persist_directory)
+        index_path = path / "index.faiss"
+        if not use_gpu:
+            # Memory-map the index so IVF code lists are paged in on demand
+            # instead of read up front; such indexes are read-only on disk
+            index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        else:
+            index = faiss.read_index(str(index_path))
+            if isinstance(index, faiss.IndexScalarQuantizer) and index.sq.qtype == faiss.ScalarQuantizer.QT_fp16:
+                # Flat indexes are saved as float16; expand them for exact search on the GPU
+                index = self._convert_flat_index(index, faiss.IndexFlatIP(index.d))
+            index = self._to_gpu(index)
+        
+        if (path / DOCSTORE_FILE).exists():
+            docstore, index_to_docstore_id = ArrowDocstore.load(path / DOCSTORE_FILE)
+        else:
+            # Stores saved before the Arrow docstore use FAISS.save_local's pickle;
+            # only load stores this app wrote
+            with open(path / "index.pkl", "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+        
+        vector_store = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+            # Vectors are normalized, so inner product is cosine similarity
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+            relevance_score_fn=_cosine_relevance_score
         )
+        if not use_gpu:
+            self._mapped_indexes.add(vector_store)
         print(f"✅ Vector store loaded from {persist_directory}")
         return vector_store
     
+    def _load_index_into_memory(self, vector_store: FAISS):
+        """
+        Replace a memory-mapped index with an in-memory copy that can be modified.
+        
+        The copy is taken from the mapped index itself rather than re-read
+        from disk, where index.faiss may since have been replaced by a save
+        of another store.
+        """
+        if vector_store not in self._mapped_indexes:
+            return
+        self._mapped_indexes.discard(vector_store)
+        
+        index = vector_store.index
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is None:
+            vector_store.index = faiss.deserialize_index(faiss.serialize_index(index))
+            return
+        
+        # Serializing would write a reference to the mapped file, so copy
+        # each code list into memory and swap the lists in place
+        mapped = ivf.invlists
+        invlists = faiss.ArrayInvertedLists(mapped.nlist, mapped.code_size)
+        for list_no in range(mapped.nlist):
+            list_size = mapped.list_size(list_no)
+            if list_size:
+                invlists.add_entries(list_no, list_size, mapped.get_ids(list_no), mapped.get_codes(list_no))
+        ivf.replace_invlists(invlists, True)
+        # The index now owns the lists
+        invlists.this.disown()
+    
     def add_documents(self, vector_store: FAISS, chunks: List) -> FAISS:
         """
         Add new documents to existing vector store.
@@ -79,11 +906,49 @@ class EmbeddingsManager:
         Args:
             vector_store: Existing FAISS vector store
             chunks: New document chunks to add
-            
+        
+        Returns:
+            Updated vector store
+        """
+        if not chunks:
+            return vector_store
+        
+        # Same cached, deduplicated bulk encoding as create_vector_store
+        vectors = self._embed_texts([chunk.page_content for chunk in chunks])
+        self.release_model_memory()
+        return self.add_documents_with_vectors(vector_store, chunks, vectors)
+    
+    def add_documents_with_vectors(self, vector_store: FAISS, chunks: List, vectors: np.ndarray) -> FAISS:
+        """
+        Add document chunks whose embeddings are already computed.
+        
+        Args:
+            vector_store: Existing FAISS vector store
+            chunks: New document chunks to add
+            vectors: Normalized embeddings, one row per chunk, from the same model as the store
+        
         Returns:
             Updated vector store
         """
-        vector_store.add_documents(chunks)
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        if len(vectors) != len(chunks):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(chunks)} chunks")
+        
+        self._load_index_into_memory(vector_store)
+        ids = [str(uuid.uuid4()) for _ in chunks]
+        vector_store.docstore.add({
+            doc_id: Document(id=doc_id, page_content=chunk.page_content, metadata=chunk.metadata)
+            for doc_id, chunk in zip(ids, chunks)
+        })
+        
+        # One batched add; rows are numbered after the existing ones
+        start = len(vector_store.index_to_docstore_id)
+        vector_store.index.add(vectors)
+        vector_store.index_to_docstore_id.update({start + i: doc_id for i, doc_id in enumerate(ids)})
+        
+        # Cached results and filter masks no longer reflect the store's contents
+        self._search_caches.pop(vector_store, None)
+        self._filter_masks.pop(vector_store, None)
         print(f"✅ Added {len(chunks)} new chunks to vector store")
         return vector_store
     
@@ -91,7 +956,8 @@ class EmbeddingsManager:
         self, 
         vector_store: FAISS, 
         query: str, 
-        k: int = 4
+        k: int = 4,
+        filter: Optional[dict] = None
     ) -> List:
         """
         Perform similarity search on vector store.
@@ -100,9 +966,142 @@ class EmbeddingsManager:
             vector_store: FAISS vector store
             query: Search query
             k: Number of results to return
-            
+            filter: Metadata values results must match; a list value matches any of its items
+        
         Returns:
             List of relevant documents
         """
-        results = vector_store.similarity_search(query, k=k)
+        # embeddings.embed_query is memoized, so repeated queries skip the model
+        query_vector = self.embeddings.embed_query(query)
+        return self.similarity_search_by_vector(vector_store, query_vector, k=k, filter=filter)
+    
+    def similarity_search_by_vector(
+        self,
+        vector_store: FAISS,
+        query_vector: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None
+    ) -> List:
+        """
+        Perform similarity search with an already embedded query.
+        
+        Results for unfiltered searches are cached per vector store and
+        reused for near-identical query vectors.
+        
+        Args:
+            vector_store: FAISS vector store
+            query_vector: Normalized query embedding
+            k: Number of results to return
+            filter: Metadata values results must match; a list value matches any of its items
+        
+        Returns:
+            List of relevant documents
+        """
+        if filter:
+            return self._filtered_search(vector_store, query_vector, k, filter)
+        
+        cache = self._search_caches.get(vector_store)
+        if cache is None:
+            cache = self._search_caches[vector_store] = SemanticCache(
+                threshold=SEARCH_CACHE_THRESHOLD,
+                capacity=SEARCH_CACHE_SIZE
+            )
+        cached = cache.lookup(query_vector)
+        if cached is not None and cached[0] >= k:
+            return cached[1][:k]
+        
+        results = vector_store.similarity_search_by_vector(query_vector, k=k)
+        cache.add(query_vector, (k, results))
         return results
+    
+    def _filtered_search(self, vector_store: FAISS, query_vector: List[float], k: int, filter: dict) -> List:
+        """
+        Search only the chunks whose metadata matches a filter.
+        
+        The filter is applied inside FAISS through an ID selector, so the
+        top k are exact matches without over-fetching. GPU indexes take no
+        selector; they over-fetch (up to the GPU k limit), and since FAISS
+        returns results best first, the first k that pass the filter are the
+        top k. When too few pass, a CPU copy of the index is searched with
+        the selector instead.
+        
+        Args:
+            vector_store: FAISS vector store
+            query_vector: Normalized query embedding
+            k: Number of results to return
+            filter: Metadata values results must match
+        
+        Returns:
+            List of matching documents, best first
+        """
+        mask = self._filter_mask(vector_store, filter)
+        if not mask.any():
+            return []
+        
+        index = vector_store.index
+        query = np.asarray([query_vector], dtype='float32')
+        k = min(k, int(mask.sum()))
+        if self.gpu_resources is not None and isinstance(index, faiss.GpuIndex):
+            ids = np.empty(0, dtype='int64')
+            if k <= GPU_MAX_K:
+                fetch_k = min(index.ntotal, k * FILTER_FETCH_FACTOR, GPU_MAX_K)
+                _, ids = index.search(query, fetch_k)
+                ids = ids[0][ids[0] >= 0]
+                ids = ids[mask[ids]][:k]
+            if len(ids) < k:
+                ids = self._selector_search(faiss.index_gpu_to_cpu(index), query, mask, k)
+        else:
+            ids = self._selector_search(index, query, mask, k)
+        
+        return [vector_store.docstore.search(vector_store.index_to_docstore_id[i]) for i in ids]
+    
+    @staticmethod
+    def _selector_search(index, query: np.ndarray, mask: np.ndarray, k: int) -> np.ndarray:
+        """
+        Search a CPU index over only the rows set in a mask.
+        
+        Args:
+            index: CPU FAISS index
+            query: Query matrix with a single row
+            mask: Boolean array with one entry per index row
+            k: Number of results to return
+        
+        Returns:
+            IDs of the top k allowed rows, best first
+        """
+        # The selector reads the packed bitmap, which must outlive the search
+        bitmap = np.packbits(mask, bitorder='little')
+        selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+        if isinstance(index, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+        elif isinstance(index, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        _, ids = index.search(query, k, params=params)
+        return ids[0][ids[0] >= 0]
+    
+    def _filter_mask(self, vector_store: FAISS, filter: dict) -> np.ndarray:
+        """
+        Compute which index rows match a metadata filter, reusing previous masks.
+        
+        Args:
+            vector_store: FAISS vector store
+            filter: Metadata values rows must match
+        
+        Returns:
+            Boolean array with one entry per index row
+        """
+        masks = self._filter_masks.setdefault(vector_store, {})
+        key = json.dumps(filter, sort_keys=True, default=str)
+        if key not in masks:
+            allowed = {
+                field: set(value) if isinstance(value, (list, tuple, set)) else {value}
+                for field, value in filter.items()
+            }
+            mask = np.zeros(vector_store.index.ntotal, dtype=bool)
+            for i, doc_id in vector_store.index_to_docstore_id.items():
+                metadata = vector_store.docstore.search(doc_id).metadata
+                mask[i] = all(metadata.get(field) in values for field, values in allowed.items())
+            masks[key] = mask
+        return masks[key]
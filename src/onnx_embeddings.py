@@ -0,0 +1,160 @@
+
+from langchain_core.embeddings import Embeddings
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from huggingface_hub import hf_hub_download
+from huggingface_hub.utils import EntryNotFoundError
+from transformers import AutoTokenizer
+from pathlib import Path
+from typing import List, Optional, Tuple
+import json
+import numpy as np
+
+# Pooling modes implemented below, as named in sentence-transformers' Pooling config
+SUPPORTED_POOLING = ("mean_tokens", "cls_token")
+
+
+def _read_model_json(model_name: str, filename: str) -> Optional[dict]:
+    """Read a JSON file from a local model directory or the HuggingFace Hub, or None if absent."""
+    if Path(model_name).is_dir():
+        path = Path(model_name) / filename
+        if not path.exists():
+            return None
+    else:
+        try:
+            path = hf_hub_download(model_name, filename)
+        except EntryNotFoundError:
+            return None
+    
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_pooling_config(model_name: str) -> Tuple[str, Optional[int]]:
+    """
+    Read the pooling mode and maximum sequence length sentence-transformers uses for a model.
+    
+    Models without a sentence-transformers config get mean pooling, as
+    sentence-transformers itself does.
+    
+    Args:
+        model_name: HuggingFace model name or local model directory
+    
+    Returns:
+        Pooling mode (e.g. "mean_tokens", "cls_token", or several joined by "+")
+        and max_seq_length, or None to use the tokenizer's limit
+    """
+    pooling = "mean_tokens"
+    for module in _read_model_json(model_name, "modules.json") or []:
+        if module["type"] == "sentence_transformers.models.Pooling":
+            config = _read_model_json(model_name, f"{module['path']}/config.json") or {}
+            modes = [key[len("pooling_mode_"):] for key, value in config.items()
+                     if key.startswith("pooling_mode_") and value is True]
+            pooling = "+".join(sorted(modes)) or pooling
+    
+    max_length = (_read_model_json(model_name, "sentence_bert_config.json") or {}).get("max_seq_length")
+    return pooling, max_length
+
+
+class ONNXEmbeddings(Embeddings):
+    """Sentence-transformer embeddings served by ONNX Runtime with int8 weights."""
+    
+    def __init__(self, model_name: str, cache_dir: Path, batch_size: int = 64, max_length: Optional[int] = None):
+        """
+        Export, quantize and load a sentence-transformer model for CPU inference.
+        The exported and quantized models are cached, so this only runs once per model.
+        
+        Pooling and the default maximum length come from the model's
+        sentence-transformers config, so vectors match the torch backend.
+        
+        Args:
+            model_name: HuggingFace model using mean or CLS pooling (e.g. all-MiniLM-L6-v2, bge-small-en-v1.5)
+            cache_dir: Directory for the exported ONNX models
+            batch_size: Number of texts encoded per forward pass
+            max_length: Maximum tokens per text; longer texts are truncated.
+                        Defaults to the model's max_seq_length
+        
+        Raises:
+            ValueError: If the model uses a pooling mode other than mean or CLS
+        """
+        self.pooling, config_max_length = read_pooling_config(model_name)
+        if self.pooling not in SUPPORTED_POOLING:
+            raise ValueError(f"Unsupported pooling mode for ONNX backend: {self.pooling}. Use the torch backend.")
+        
+        self.batch_size = batch_size
+        
+        export_dir = cache_dir / "fp32"
+        quantized_dir = cache_dir / "int8"
+        
+        if not (export_dir / "model.onnx").exists():
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            model.save_pretrained(export_dir)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+        
+        if not (quantized_dir / "model_quantized.onnx").exists():
+            # Dynamic int8 quantization runs on VNNI dot-product instructions
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            quantizer.quantize(
+                save_dir=quantized_dir,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            )
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            quantized_dir,
+            file_name="model_quantized.onnx",
+            provider="CPUExecutionProvider"
+        )
+        
+        # Without a configured length, sentence-transformers caps at the position embeddings
+        self.max_length = max_length or config_max_length or min(
+            self.tokenizer.model_max_length, self.model.config.max_position_embeddings
+        )
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts in batches with the model's pooling and L2 normalization.
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            One normalized embedding per text
+        """
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = [text.replace("\n", " ") for text in texts[start:start + self.batch_size]]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            vectors.extend(self.embed_features(encoded).tolist())
+        
+        return vectors
+    
+    def embed_features(self, encoded) -> np.ndarray:
+        """
+        Embed one batch of already tokenized texts.
+        
+        Args:
+            encoded: Padded tokenizer output as numpy arrays
+        
+        Returns:
+            Normalized embeddings, one row per text
+        """
+        hidden = self.model(**encoded).last_hidden_state
+        
+        if self.pooling == "cls_token":
+            pooled = hidden[:, 0]
+        else:
+            # Mean over real tokens only, ignoring padding
+            mask = encoded["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        return self.embed_documents([text])[0]
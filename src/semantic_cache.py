@@ -0,0 +1,69 @@
+
+from collections import OrderedDict
+from typing import Any, List, Optional
+import numpy as np
+import faiss
+
+
+class SemanticCache:
+    """Caches payloads keyed by query embedding, matched by cosine similarity."""
+    
+    def __init__(self, threshold: float = 0.95, capacity: int = 256):
+        """
+        Initialize an empty semantic cache.
+        
+        Args:
+            threshold: Minimum cosine similarity for a cached entry to count as a hit
+            capacity: Maximum number of entries; the least recently used is evicted first
+        """
+        self.threshold = threshold
+        self.capacity = capacity
+        self.index = None
+        self.payloads: "OrderedDict[int, Any]" = OrderedDict()
+        self._next_id = 0
+    
+    def lookup(self, vector: List[float]) -> Optional[Any]:
+        """
+        Find the payload cached for the most similar query.
+        
+        Args:
+            vector: Normalized query embedding
+        
+        Returns:
+            Cached payload, or None if no entry reaches the threshold
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return None
+        
+        scores, ids = self.index.search(np.asarray([vector], dtype='float32'), 1)
+        if scores[0, 0] >= self.threshold:
+            entry_id = int(ids[0, 0])
+            self.payloads.move_to_end(entry_id)
+            return self.payloads[entry_id]
+        return None
+    
+    def add(self, vector: List[float], payload: Any):
+        """
+        Cache a payload under a query embedding.
+        
+        Args:
+            vector: Normalized query embedding
+            payload: Value returned by later lookups of similar queries
+        """
+        if self.index is None:
+            # Exact search: the cache stays small enough that a graph index would not pay off.
+            # The ID map lets evicted entries be removed without renumbering the rest.
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(len(vector)))
+        entry_id = self._next_id
+        self._next_id += 1
+        self.index.add_with_ids(np.asarray([vector], dtype='float32'), np.asarray([entry_id], dtype='int64'))
+        self.payloads[entry_id] = payload
+        
+        if len(self.payloads) > self.capacity:
+            evicted_id, _ = self.payloads.popitem(last=False)
+            self.index.remove_ids(np.asarray([evicted_id], dtype='int64'))
+    
+    def clear(self):
+        """Remove all cached entries."""
+        self.index = None
+        self.payloads = OrderedDict()
@@ -1,30 +1,125 @@
 
 import streamlit as st
 import os
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import shutil
+import threading
+import uuid
+
+from src.embeddings_manager import EmbeddingsManager
+
+
+# Uploads are saved here, one subdirectory per distinct file
+_TEMP_DIR = "temp_uploads"
+os.makedirs(_TEMP_DIR, exist_ok=True)
+
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_CLOEXEC", 0) | getattr(os, "O_BINARY", 0)
+
+
+@st.cache_resource
+def get_ingest_executor() -> ThreadPoolExecutor:
+    """
+    Get the process-wide executor for background document processing.
+    
+    Returns:
+        Thread pool shared by all sessions, surviving script reruns
+    """
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="ingest")
+
+
+@st.cache_resource
+def get_embeddings_manager(model: str = "sentence-transformers/all-MiniLM-L6-v2") -> EmbeddingsManager:
+    """
+    Get the process-wide embeddings manager for a model.
+    
+    Args:
+        model: HuggingFace embedding model to use
+        
+    Returns:
+        Embeddings manager loaded once and shared by all sessions and reruns
+    """
+    return EmbeddingsManager(model)
+
+
+@st.cache_resource
+def get_vector_store(persist_directory: str):
+    """
+    Get a persisted vector store, loaded once per directory.
+    
+    Args:
+        persist_directory: Directory where vector store is saved
+        
+    Returns:
+        FAISS vector store shared by all sessions and reruns
+    """
+    return get_embeddings_manager().load_vector_store(persist_directory)
 
 
 def save_uploaded_file(uploaded_file) -> str:
     """
     Save an uploaded file to the temp directory.
     
+    Each file goes in a subdirectory named after a digest of its contents,
+    so uploads sharing a name never overwrite each other, while re-uploads
+    of the same file keep the same path (and so the same cached index).
+    
     Args:
         uploaded_file: Streamlit uploaded file object
         
     Returns:
         Path to saved file
     """
-    # Create temp directory if it doesn't exist
-    temp_dir = Path("temp_uploads")
-    temp_dir.mkdir(exist_ok=True)
+    # The upload is already held in memory; getbuffer exposes it without
+    # copying, and unbuffered writes go straight from it to the file
+    with uploaded_file.getbuffer() as view:
+        digest = hashlib.blake2b(view, digest_size=16, usedforsecurity=False).hexdigest()
+        file_dir = os.path.join(_TEMP_DIR, digest)
+        file_path = os.path.join(file_dir, uploaded_file.name)
+        if os.path.exists(file_path):
+            return file_path
+        
+        # Write beside the target and rename, so a file being read by another
+        # session is never seen half-written
+        os.makedirs(file_dir, exist_ok=True)
+        temp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        fd = os.open(temp_path, _WRITE_FLAGS, 0o644)
+        try:
+            if view.nbytes and hasattr(os, "posix_fallocate"):
+                # Reserve the space up front so the file is laid out contiguously
+                os.posix_fallocate(fd, 0, view.nbytes)
+            
+            written = 0
+            while written < view.nbytes:
+                # os.write may write less than asked, so continue from where it stopped
+                written += os.write(fd, view[written:])
+        except BaseException:
+            # Don't leave a partial file behind, e.g. when the disk is full
+            os.close(fd)
+            os.unlink(temp_path)
+            raise
+        os.close(fd)
+    
+    os.replace(temp_path, file_path)
+    return file_path
+
+
+def save_uploaded_files(uploaded_files: list) -> list:
+    """
+    Save several uploaded files to the temp directory concurrently.
     
-    # Save file
-    file_path = temp_dir / uploaded_file.name
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    Args:
+        uploaded_files: Streamlit uploaded file objects
+        
+    Returns:
+        Paths to the saved files, in the same order
+    """
+    if not uploaded_files:
+        return []
     
-    return str(file_path)
+    # File writes release the GIL, so the copies overlap
+    with ThreadPoolExecutor(max_workers=min(8, len(uploaded_files))) as pool:
+        return list(pool.map(save_uploaded_file, uploaded_files))
 
 
 def clear_chat_history():
@@ -36,10 +131,12 @@ def clear_chat_history():
 
 def clear_temp_files():
     """Clear temporary uploaded files."""
-    temp_dir = Path("temp_uploads")
-    if temp_dir.exists():
-        shutil.rmtree(temp_dir)
-        temp_dir.mkdir(exist_ok=True)
+    if os.path.exists(_TEMP_DIR):
+        # Renaming is instant; the old files are deleted without blocking the UI
+        old_dir = f"{_TEMP_DIR}.{uuid.uuid4().hex}"
+        os.rename(_TEMP_DIR, old_dir)
+        os.makedirs(_TEMP_DIR, exist_ok=True)
+        threading.Thread(target=shutil.rmtree, args=(old_dir,), kwargs={"ignore_errors": True}, daemon=True).start()
 
 
 def format_sources(sources: list) -> str:
@@ -55,8 +152,4 @@ def format_sources(sources: list) -> str:
     if not sources:
         return "No sources found"
     
-    formatted = []
-    for i, source in enumerate(sources, 1):
-        formatted.append(f"**Source {i}:**\n{source}\n")
-    
-    return "\n".join(formatted)
+    return "\n".join(f"**Source {i}:**\n{source}\n" for i, source in enumerate(sources, 1))